@@ -1,17 +1,26 @@
 import os
+import asyncio
+import hashlib
 import logging
-import time
-from datetime import datetime
-from telebot import TeleBot, types
+import re
+import secrets
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+from aiohttp import web
+from aiogram import Bot, Dispatcher, F, types
+from aiogram.filters import CommandStart
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 import google.generativeai as genai
 from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from cachetools import TTLCache
 from PIL import Image
 from io import BytesIO
 from dotenv import load_dotenv
-from serpapi import GoogleSearch
-import sys
-from PyPDF2 import PdfReader
-from serpapi import GoogleSearch
+import httpx
+import pypdfium2 as pdfium
 
 # Load environment variables
 load_dotenv()
@@ -27,131 +36,252 @@ BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 MONGO_URI = os.getenv("MONGO_URI")
 SERP_API_KEY = os.getenv("SERP_API_KEY")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+# Telegram echoes this in every webhook request; updates without it are rejected
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
 
-if not all([BOT_TOKEN, GEMINI_API_KEY, MONGO_URI, SERP_API_KEY]):
+if not all([BOT_TOKEN, GEMINI_API_KEY, MONGO_URI, SERP_API_KEY, WEBHOOK_URL]):
     logging.error("Missing required environment variables")
     exit(1)
 
 # Initialize components
-bot = TeleBot(BOT_TOKEN)
+bot = Bot(BOT_TOKEN)
+dp = Dispatcher()
+# The model's async client (grpc_asyncio by default) is created once and its channel reused by every call
 genai.configure(api_key=GEMINI_API_KEY)
 model = genai.GenerativeModel('gemini-1.5-flash')
+# Shared SerpAPI client keeps the TLS connection alive between searches
+serp_client = httpx.AsyncClient(base_url="https://serpapi.com", timeout=10.0)
 
 # Database connection
 try:
-    mongo_client = MongoClient(MONGO_URI)
-    mongo_client.server_info()
+    # Blocking connectivity check at startup only
+    with MongoClient(MONGO_URI) as sync_client:
+        sync_client.server_info()
+        # Idempotent: indexes every chat_id lookup and the per-chat report sort
+        sync_db = sync_client['telegram_bot']
+        indexes = [
+            ('users', "chat_id", {"unique": True}),
+            ('sentiments', [("chat_id", 1), ("timestamp", -1)], {}),
+            # Gemini responses keyed by prompt hash, expired after a day
+            ('gemini_cache', "key", {"unique": True}),
+            ('gemini_cache', "created_at", {"expireAfterSeconds": 86400}),
+        ]
+        for collection, keys, options in indexes:
+            try:
+                sync_db[collection].create_index(keys, **options)
+            except Exception as e:
+                # e.g. existing duplicate users; the bot still works, just without the index
+                logging.error(f"Index creation on {collection} failed: {e}")
+    # Bounded pool with warm connections; short timeouts surface outages instead of hanging handlers
+    mongo_client = AsyncIOMotorClient(
+        MONGO_URI,
+        maxPoolSize=50,
+        minPoolSize=10,
+        serverSelectionTimeoutMS=3000,
+        connectTimeoutMS=3000,
+        socketTimeoutMS=5000,
+        retryWrites=True
+    )
     db = mongo_client['telegram_bot']
     users_collection = db['users']
     sentiments_collection = db['sentiments']
+    gemini_cache_collection = db['gemini_cache']
 except Exception as e:
     logging.error(f"Database connection failed: {e}")
     exit(1)
 
+# User documents by chat_id, so repeat commands skip Mongo
+user_cache = TTLCache(maxsize=10000, ttl=300)
+
+# Strong references to fire-and-forget tasks until they finish
+background_tasks = set()
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(_on_background_done)
+    return task
+
+def _on_background_done(task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logging.error(f"Background task error: {task.exception()}")
+
+async def cached_generate(prompt):
+    # Text prompts only; repeats are served from Mongo instead of Gemini
+    key = hashlib.sha256(prompt.encode()).hexdigest()
+    hit = await gemini_cache_collection.find_one({"key": key})
+    if hit:
+        return hit["response"]
+    
+    response = await model.generate_content_async(prompt)
+    run_in_background(gemini_cache_collection.update_one(
+        {"key": key},
+        {"$set": {"response": response.text, "created_at": datetime.now(timezone.utc)}},
+        upsert=True
+    ))
+    return response.text
+
+# Conversation states (replace telebot's register_next_step_handler)
+class BotStates(StatesGroup):
+    web_search = State()
+    gemini_chat = State()
+
 # ========================
 # CORE FUNCTIONS
 # ========================
 
-@bot.message_handler(commands=['start'])
-def handle_start(message):
+@dp.message(CommandStart())
+async def handle_start(message):
     chat_id = message.chat.id
-    user = users_collection.find_one({"chat_id": chat_id})
+    user = await get_user(chat_id)
     
+    created = False
     if not user:
-        users_collection.insert_one({
-            "chat_id": chat_id,
-            "first_name": message.from_user.first_name,
-            "username": message.from_user.username,
-            "phone_number": None,
-            "created_at": datetime.now()
-        })
-        bot.send_message(chat_id, "👋 Welcome! Please share your phone number to continue.")
-        request_phone_number(message)
+        # Upsert so concurrent /start updates can't trip the unique chat_id index
+        result = await users_collection.update_one(
+            {"chat_id": chat_id},
+            {"$setOnInsert": {
+                "first_name": message.from_user.first_name,
+                "username": message.from_user.username,
+                "phone_number": None,
+                "created_at": datetime.now()
+            }},
+            upsert=True
+        )
+        created = result.upserted_id is not None
+    
+    if created:
+        await bot.send_message(chat_id, "👋 Welcome! Please share your phone number to continue.")
+        await request_phone_number(message)
     else:
-        show_main_menu(message)
-
-def show_main_menu(message):
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    markup.row("📷 Image Analysis", "🌐 Web Search")
-    markup.row("📊 Sentiment Report", "👤 My Profile")
-    markup.row("💬 Chat with Gemini", "🛑 Stop Bot")
-    bot.send_message(
+        await show_main_menu(message)
+
+async def show_main_menu(message):
+    markup = types.ReplyKeyboardMarkup(
+        keyboard=[
+            [types.KeyboardButton(text="📷 Image Analysis"), types.KeyboardButton(text="🌐 Web Search")],
+            [types.KeyboardButton(text="📊 Sentiment Report"), types.KeyboardButton(text="👤 My Profile")],
+            [types.KeyboardButton(text="💬 Chat with Gemini"), types.KeyboardButton(text="🛑 Stop Bot")],
+        ],
+        resize_keyboard=True
+    )
+    await bot.send_message(
         message.chat.id,
         "🔧 Main Menu - Select an option:",
         reply_markup=markup
     )
 
 
+async def finish_status(chat_id, status_task, text):
+    # Replace a "processing" notice with the final text in one API call
+    status_msg = None
+    if status_task:
+        try:
+            status_msg = await status_task
+        except Exception as e:
+            logging.error(f"Status message error: {e}")
+    if status_msg:
+        await bot.edit_message_text(text=text, chat_id=chat_id, message_id=status_msg.message_id)
+    else:
+        await bot.send_message(chat_id, text)
+
+
 # ========================
 # MENU HANDLERS
 # ========================
 
-@bot.message_handler(func=lambda msg: msg.text in [
-    "📷 Image Analysis", "🌐 Web Search",
-    "📊 Sentiment Report", "👤 My Profile",
-    "💬 Chat with Gemini", "🛑 Stop Bot"
-])
-def handle_menu_selection(message):
+async def prompt_image_analysis(message, state):
+    await bot.send_message(message.chat.id, "📤 Please send an image for analysis")
+
+async def prompt_web_search(message, state):
+    await bot.send_message(message.chat.id, "🔍 What would you like to search for?")
+    await state.set_state(BotStates.web_search)
+
+async def prompt_gemini_chat(message, state):
+    await bot.send_message(message.chat.id, "🤖 Ask anything to Gemini AI:")
+    await state.set_state(BotStates.gemini_chat)
+
+# Button text -> action, so routing is a single dict lookup
+MENU_ACTIONS = {
+    "📷 Image Analysis": prompt_image_analysis,
+    "🌐 Web Search": prompt_web_search,
+    "📊 Sentiment Report": lambda message, state: generate_sentiment_report(message),
+    "👤 My Profile": lambda message, state: show_user_profile(message),
+    "💬 Chat with Gemini": prompt_gemini_chat,
+    "🛑 Stop Bot": stop_bot,
+}
+MENU_TEXTS = frozenset(MENU_ACTIONS)
+
+@dp.message(F.text.in_(MENU_TEXTS))
+async def handle_menu_selection(message, state: FSMContext):
     chat_id = message.chat.id
     try:
-        if message.text == "📷 Image Analysis":
-            bot.send_message(chat_id, "📤 Please send an image for analysis")
-            
-        elif message.text == "🌐 Web Search":
-            msg = bot.send_message(chat_id, "🔍 What would you like to search for?")
-            bot.register_next_step_handler(msg, process_web_search)
-            
-        elif message.text == "📊 Sentiment Report":
-            generate_sentiment_report(message)
-            
-        elif message.text == "👤 My Profile":
-            show_user_profile(message)
-        
-        elif message.text == "💬 Chat with Gemini":
-            msg = bot.send_message(chat_id, "🤖 Ask anything to Gemini AI:")
-            bot.register_next_step_handler(msg, chat_with_gemini)
-            
-        elif message.text == "🛑 Stop Bot":
-            stop_bot(message)
-            
+        await MENU_ACTIONS[message.text](message, state)
     except Exception as e:
         logging.error(f"Menu handler error: {e}")
-        bot.send_message(chat_id, "⚠️ Error processing your request")
+        await bot.send_message(chat_id, "⚠️ Error processing your request")
 # ========================
 # CHAT WITH GEMINI
 # ========================
 
-def chat_with_gemini(message):
+@dp.message(BotStates.gemini_chat, F.text)
+async def chat_with_gemini(message, state: FSMContext):
+    await state.clear()
     chat_id = message.chat.id
     user_input = message.text.strip()
 
     if not user_input:
-        bot.send_message(chat_id, "❌ Please enter a valid query.")
+        await bot.send_message(chat_id, "❌ Please enter a valid query.")
         return
     
     try:
-        bot.send_message(chat_id, "🤖 Thinking...")
+        await bot.send_message(chat_id, "🤖 Thinking...")
 
-        response = model.generate_content(user_input)
-        bot.send_message(chat_id, f"💡 Gemini says:\n{response.text}")
+        # One call returns both the answer and the message sentiment
+        prompt = f"""Answer the user, then on a separate line output SENTIMENT: positive|neutral|negative.
+        User: {user_input}"""
+        
+        answer, sentiment = split_sentiment(await cached_generate(prompt))
+        if sentiment:
+            record_sentiment(chat_id, user_input, sentiment)
+        await bot.send_message(chat_id, f"💡 Gemini says:\n{answer}")
 
     except Exception as e:
         logging.error(f"Gemini chat error: {e}")
-        bot.send_message(chat_id, "⚠️ Failed to fetch a response from Gemini.")
+        await bot.send_message(chat_id, "⚠️ Failed to fetch a response from Gemini.")
+
+# Tolerates markdown around the tag, e.g. "**SENTIMENT:** Positive."
+SENTIMENT_TAG = re.compile(r'^[\W_]*sentiment[\W_]*:[\W_]*(positive|neutral|negative)\b', re.IGNORECASE)
+
+def split_sentiment(text):
+    lines = text.strip().splitlines()
+    # The tag may be followed by a trailing line or two, so check the last few
+    for i in range(len(lines) - 1, max(len(lines) - 4, -1), -1):
+        match = SENTIMENT_TAG.match(lines[i].strip())
+        if match:
+            answer = "\n".join(lines[:i] + lines[i + 1:]).strip()
+            return answer, match.group(1).lower()
+    return text, None
 
 # ========================
 # WEB SEARCH FUNCTIONALITY
 # ========================
 
-def process_web_search(message):
+@dp.message(BotStates.web_search, F.text)
+async def process_web_search(message, state: FSMContext):
+    await state.clear()
     chat_id = message.chat.id
     try:
         query = message.text.strip()
         if not query:
-            bot.send_message(chat_id, "❌ Search cancelled")
+            await bot.send_message(chat_id, "❌ Search cancelled")
             return
             
-        bot.send_message(chat_id, "🔎 Searching the web...")
+        await bot.send_message(chat_id, "🔎 Searching the web...")
         
         params = {
             "q": query,
@@ -159,22 +289,31 @@ def process_web_search(message):
             "engine": "google",
         }
         
-        search = GoogleSearch(params)
-        results = search.get_dict().get('organic_results', [])[:3]
+        r = await serp_client.get("/search", params=params)
+        if not r.is_success:
+            # api_key is in the request URL, so log only the status and SerpAPI's error field
+            try:
+                error = r.json().get('error')
+            except ValueError:
+                error = None
+            logging.error(f"Search error: HTTP {r.status_code} {error or ''}".strip())
+            await bot.send_message(chat_id, "⚠️ Search failed. Please try again")
+            return
+        results = r.json().get('organic_results', [])[:3]
         
         if results:
             response = "\n".join(
                 [f"{i+1}. [{res['title']}]({res['link']})" 
                  for i, res in enumerate(results)]
             )
-            bot.send_message(chat_id, f"🌐 Top Results for '{query}':\n{response}", 
+            await bot.send_message(chat_id, f"🌐 Top Results for '{query}':\n{response}", 
                            parse_mode="Markdown")
         else:
-            bot.send_message(chat_id, "❌ No results found")
+            await bot.send_message(chat_id, "❌ No results found")
             
     except Exception as e:
         logging.error(f"Search error: {e}")
-        bot.send_message(chat_id, "⚠️ Search failed. Please try again")
+        await bot.send_message(chat_id, "⚠️ Search failed. Please try again")
 
 # ========================
 # IMAGE PROCESSING
@@ -185,61 +324,56 @@ def process_web_search(message):
 # PDF PROCESSING
 # ========================
 
-@bot.message_handler(content_types=['document'])
-def handle_pdf(message):
+@dp.message(F.document)
+async def handle_pdf(message):
     chat_id = message.chat.id
+    status_task = None
     try:
         if message.document.mime_type != 'application/pdf':
-            bot.send_message(chat_id, "⚠️ Please send a PDF file")
+            await bot.send_message(chat_id, "⚠️ Please send a PDF file")
             return
 
-        # Send processing message
-        processing_msg = bot.send_message(chat_id, "📄 Processing PDF...")
-
-        # Download PDF file
-        file_info = bot.get_file(message.document.file_id)
-        file_data = bot.download_file(file_info.file_path)
-        
-        # Save to temporary file
-        pdf_path = f"temp_{chat_id}.pdf"
-        with open(pdf_path, 'wb') as f:
-            f.write(file_data)
+        # Send processing message while downloading the PDF into memory
+        status_task = asyncio.create_task(bot.send_message(chat_id, "📄 Processing PDF..."))
+        pdf_file = await bot.download(message.document, destination=BytesIO())
 
         # Extract text from PDF
-        text = extract_text_from_pdf(pdf_path)
+        text = extract_text_from_pdf(pdf_file)
         
         if not text:
-            bot.send_message(chat_id, "❌ No text found in PDF")
+            await finish_status(chat_id, status_task, "❌ No text found in PDF")
             return
 
         # Classify content using Gemini
-        classification = classify_pdf_content(text)
-        bot.send_message(chat_id, f"📑 PDF Analysis:\n{classification}")
+        classification = await classify_pdf_content(text)
+        await finish_status(chat_id, status_task, f"📑 PDF Analysis:\n{classification}")
 
     except Exception as e:
         logging.error(f"PDF error: {str(e)}")
-        bot.send_message(chat_id, "⚠️ Error processing PDF")
-    finally:
-        try:
-            os.remove(pdf_path)  # Cleanup temp file
-            bot.delete_message(chat_id, processing_msg.message_id)
-        except:
-            pass
+        await finish_status(chat_id, status_task, "⚠️ Error processing PDF")
 
-def extract_text_from_pdf(pdf_path):
+def extract_text_from_pdf(pdf_file, max_chars=10000):
     try:
-        reader = PdfReader(pdf_path)
-        text = ""
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-        return text.strip()
+        pdf = pdfium.PdfDocument(pdf_file)
+        try:
+            parts = []
+            length = 0
+            for page in pdf:
+                page_text = page.get_textpage().get_text_range()
+                if page_text:
+                    parts.append(page_text + "\n")
+                    length += len(page_text) + 1
+                    # Gemini only sees the first max_chars, skip the remaining pages
+                    if length >= max_chars:
+                        break
+        finally:
+            pdf.close()
+        return "".join(parts)[:max_chars].strip()
     except Exception as e:
         logging.error(f"PDF extraction error: {e}")
         return ""
 
-def classify_pdf_content(text):
+async def classify_pdf_content(text):
     try:
         prompt = f"""Analyze this document and provide:
         1. Document type (report, article, etc.)
@@ -249,43 +383,40 @@ def classify_pdf_content(text):
         
         Document content: {text[:10000]}"""  # Limit to first 10k characters
         
-        response = model.generate_content(prompt)
-        return response.text
+        return await cached_generate(prompt)
     except Exception as e:
         logging.error(f"Classification error: {e}")
         return "⚠️ Failed to analyze document content"
 
 # ... (keep all other existing functions unchanged)
-@bot.message_handler(content_types=['photo'])
-def handle_image(message):
+@dp.message(F.photo)
+async def handle_image(message):
     chat_id = message.chat.id
+    status_task = None
     try:
-        processing_msg = bot.send_message(chat_id, "🖼️ Analyzing image...")
-        
-        file_info = bot.get_file(message.photo[-1].file_id)
-        image_data = bot.download_file(file_info.file_path)
-        img = Image.open(BytesIO(image_data))
+        status_task = asyncio.create_task(bot.send_message(chat_id, "🖼️ Analyzing image..."))
+        # Download straight into the buffer PIL reads from (rewound by aiogram)
+        image_file = await bot.download(message.photo[-1], destination=BytesIO())
+        img = Image.open(image_file)
         
-        response = model.generate_content(["Describe this image in detail", img])
-        response.resolve()
+        response = await model.generate_content_async(["Describe this image in detail", img])
         
-        bot.send_message(chat_id, f"📸 Image Analysis:\n{response.text}")
-        bot.send_message(chat_id, "💡 Ask follow-up questions about the image")
+        await finish_status(
+            chat_id,
+            status_task,
+            f"📸 Image Analysis:\n{response.text}\n\n💡 Ask follow-up questions about the image"
+        )
         
     except Exception as e:
-        bot.send_message(chat_id, f"⚠️ Error: {str(e)}")
-    finally:
-        try:
-            bot.delete_message(chat_id, processing_msg.message_id)
-        except:
-            pass
+        await finish_status(chat_id, status_task, f"⚠️ Error: {str(e)}")
 
 # ========================
 # SENTIMENT ANALYSIS
 # ========================
 
-@bot.message_handler(func=lambda msg: True)
-def analyze_sentiment(message):
+# Button taps are never sentiment-classified, whatever handler order is in effect
+@dp.message(F.text & ~F.text.in_(MENU_TEXTS))
+async def analyze_sentiment(message):
     chat_id = message.chat.id
     text = message.text.strip()
     
@@ -296,43 +427,75 @@ def analyze_sentiment(message):
         prompt = f"""Classify sentiment as Positive, Neutral, or Negative:
         Message: {text}"""
         
-        response = model.generate_content(prompt)
-        sentiment = response.text.strip().lower()
-        
-        sentiments_collection.insert_one({
-            "chat_id": chat_id,
-            "message": text,
-            "sentiment": sentiment,
-            "timestamp": datetime.now()
-        })
+        response = await cached_generate(prompt)
+        sentiment = response.strip().lower()
         
         if "positive" in sentiment:
-            bot.send_message(chat_id, "😊 Positive vibes detected!")
+            reply = "😊 Positive vibes detected!"
         elif "negative" in sentiment:
-            bot.send_message(chat_id, "😟 Negative sentiment noted")
+            reply = "😟 Negative sentiment noted"
         else:
-            bot.send_message(chat_id, "🤔 Neutral message recorded")
+            reply = "🤔 Neutral message recorded"
+        
+        record_sentiment(chat_id, text, sentiment)
+        await bot.send_message(chat_id, reply)
             
     except Exception as e:
         logging.error(f"Sentiment error: {e}")
 
-def generate_sentiment_report(message):
+# Sentiment records waiting to be written in bulk by flush_sentiments
+sentiment_queue = asyncio.Queue()
+SENTIMENT_BATCH_SIZE = 100
+
+def record_sentiment(chat_id, text, sentiment):
+    # Queued so the reply is not held up by the write
+    sentiment_queue.put_nowait({
+        "chat_id": chat_id,
+        "message": text,
+        "sentiment": sentiment,
+        "timestamp": datetime.now()
+    })
+
+def drain_sentiment_queue(batch):
+    while len(batch) < SENTIMENT_BATCH_SIZE and not sentiment_queue.empty():
+        batch.append(sentiment_queue.get_nowait())
+    return batch
+
+async def insert_sentiments(batch):
+    try:
+        await sentiments_collection.insert_many(batch, ordered=False)
+    except Exception as e:
+        logging.error(f"Sentiment flush error: {e}")
+
+async def flush_sentiments():
+    while True:
+        batch = drain_sentiment_queue([await sentiment_queue.get()])
+        await insert_sentiments(batch)
+        await asyncio.sleep(1)
+
+async def generate_sentiment_report(message):
     chat_id = message.chat.id
     try:
-        records = list(sentiments_collection.find(
-            {"chat_id": chat_id},
-            sort=[("timestamp", -1)],
-            limit=10
-        ))
+        # Count the last 10 sentiments server-side
+        groups = await sentiments_collection.aggregate([
+            {"$match": {"chat_id": chat_id}},
+            {"$sort": {"timestamp": -1}},
+            {"$limit": 10},
+            {"$group": {"_id": "$sentiment", "n": {"$sum": 1}}}
+        ]).to_list(length=None)
         
-        if not records:
-            bot.send_message(chat_id, "📊 Start chatting to generate insights!")
+        if not groups:
+            await bot.send_message(chat_id, "📊 Start chatting to generate insights!")
             return
             
-        positive = sum(1 for r in records if 'positive' in r['sentiment'])
-        neutral = sum(1 for r in records if 'neutral' in r['sentiment'])
-        negative = sum(1 for r in records if 'negative' in r['sentiment'])
-        total = len(records)
+        counts = {"positive": 0, "neutral": 0, "negative": 0}
+        total = 0
+        for group in groups:
+            total += group['n']
+            for key in counts:
+                if key in group['_id']:
+                    counts[key] += group['n']
+        positive, neutral, negative = counts["positive"], counts["neutral"], counts["negative"]
         
         report = f"""
 📈 Emotional Analysis (Last {total} messages):
@@ -344,20 +507,28 @@ def generate_sentiment_report(message):
                  "😟 Needs Support" if negative > positive else 
                  "⚖️ Balanced Emotions"}
         """
-        bot.send_message(chat_id, report)
+        await bot.send_message(chat_id, report)
         
     except Exception as e:
         logging.error(f"Report error: {e}")
-        bot.send_message(chat_id, "⚠️ Failed to generate report")
+        await bot.send_message(chat_id, "⚠️ Failed to generate report")
 
 # ========================
 # USER MANAGEMENT
 # ========================
 
-def show_user_profile(message):
+async def get_user(chat_id):
+    user = user_cache.get(chat_id)
+    if user is None:
+        user = await users_collection.find_one({"chat_id": chat_id})
+        if user:
+            user_cache[chat_id] = user
+    return user
+
+async def show_user_profile(message):
     chat_id = message.chat.id
     try:
-        user = users_collection.find_one({"chat_id": chat_id})
+        user = await get_user(chat_id)
         if user:
             response = (
                 "👤 User Profile:\n"
@@ -365,51 +536,73 @@ def show_user_profile(message):
                 f"├ Username: @{user.get('username', 'N/A')}\n"
                 f"└ Phone: {user.get('phone_number', 'Not provided')}"
             )
-            bot.send_message(chat_id, response)
+            await bot.send_message(chat_id, response)
         else:
-            bot.send_message(chat_id, "❌ Profile not found")
+            await bot.send_message(chat_id, "❌ Profile not found")
     except Exception as e:
         logging.error(f"Profile error: {e}")
-        bot.send_message(chat_id, "⚠️ Failed to load profile")
+        await bot.send_message(chat_id, "⚠️ Failed to load profile")
 
-def request_phone_number(message):
+async def request_phone_number(message):
+    button = types.KeyboardButton(text="📱 Share Phone Number", request_contact=True)
     markup = types.ReplyKeyboardMarkup(
+        keyboard=[[button]],
         one_time_keyboard=True,
         resize_keyboard=True
     )
-    button = types.KeyboardButton("📱 Share Phone Number", request_contact=True)
-    markup.add(button)
-    bot.send_message(
+    await bot.send_message(
         message.chat.id,
         "🔐 Please share your phone number:",
         reply_markup=markup
     )
 
-@bot.message_handler(content_types=['contact'])
-def save_phone_number(message):
+@dp.message(F.contact)
+async def save_phone_number(message):
     chat_id = message.chat.id
     try:
         if message.contact:
-            users_collection.update_one(
+            await users_collection.update_one(
                 {"chat_id": chat_id},
                 {"$set": {"phone_number": message.contact.phone_number}}
             )
-            bot.send_message(chat_id, "✅ Phone number saved!")
-            show_main_menu(message)
+            user_cache.pop(chat_id, None)
+            await bot.send_message(chat_id, "✅ Phone number saved!")
+            await show_main_menu(message)
     except Exception as e:
         logging.error(f"Phone save error: {e}")
-        bot.send_message(chat_id, "⚠️ Failed to save contact")
+        await bot.send_message(chat_id, "⚠️ Failed to save contact")
 
 # ========================
 # SYSTEM CONTROLS
 # ========================
 
-def stop_bot(message):
+async def stop_bot(message, state):
+    # Ends only this user's session; the process keeps serving everyone else
     chat_id = message.chat.id
-    bot.send_message(chat_id, "🛑 Session ended. Use /start to begin again!")
-    logging.info(f"Bot stopped by {chat_id}")
-    bot.stop_polling()
-    sys.exit(0)
+    await state.clear()
+    await bot.send_message(
+        chat_id,
+        "🛑 Session ended. Use /start to begin again!",
+        reply_markup=types.ReplyKeyboardRemove()
+    )
+    logging.info(f"Session stopped by {chat_id}")
+
+sentiment_flusher = None
+
+@dp.startup()
+async def on_startup():
+    global sentiment_flusher
+    sentiment_flusher = run_in_background(flush_sentiments())
+    await bot.set_webhook(WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+
+@dp.shutdown()
+async def on_shutdown():
+    if sentiment_flusher:
+        sentiment_flusher.cancel()
+    # Write whatever is still buffered before exiting
+    while not sentiment_queue.empty():
+        await insert_sentiments(drain_sentiment_queue([]))
+    await serp_client.aclose()
 
 # ========================
 # MAIN EXECUTION
@@ -417,9 +610,10 @@ def stop_bot(message):
 
 if __name__ == "__main__":
     logging.info("Starting bot...")
-    while True:
-        try:
-            bot.polling(non_stop=True, interval=2)
-        except Exception as e:
-            logging.error(f"Polling error: {e}")
-            time.sleep(5)
\ No newline at end of file
+    # Telegram pushes updates to the webhook, so there is no polling loop
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(
+        app, path=urlparse(WEBHOOK_URL).path or "/"
+    )
+    setup_application(app, dp, bot=bot)
+    web.run_app(app, host=WEBAPP_HOST, port=WEBAPP_PORT)